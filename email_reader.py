@@ -4,41 +4,59 @@ import email
 import re
 import logging
 import os
+import functools
+from collections import namedtuple
+import subprocess
+import sys
+import time
 
-# Чтение конфига для всего приложения
-config = configparser.ConfigParser()
-config_file = 'config.properties'
-loaded = config.read(config_file)
-if not loaded:
-    raise FileNotFoundError(f"Не удалось прочитать файл конфига: {config_file}")
-
-# Настройка логирования из конфига
-if 'Logging' in config:
-    log_cfg = config['Logging']
-    log_file = log_cfg.get('file', fallback=None)
-    log_level_str = log_cfg.get('level', fallback='INFO').upper()
-    log_level = logging._nameToLevel.get(log_level_str, logging.INFO)
-    handlers = []
-    if log_file:
-        handlers.append(logging.FileHandler(log_file))
+CONFIG_FILE = 'config.properties'
+
+
+def load_config(config_file=CONFIG_FILE):
+    """
+    Читает конфиг приложения. Каждый вызов возвращает новый ConfigParser;
+    кэшируются только разобранные настройки IMAP (ImapConfig.load()).
+    """
+    config = configparser.ConfigParser()
+    loaded = config.read(config_file)
+    if not loaded:
+        raise FileNotFoundError(f"Не удалось прочитать файл конфига: {config_file}")
+    return config
+
+
+def setup_logging(config):
+    """
+    Настройка логирования из секции [Logging] конфига.
+    Вызывается явно приложением, а не при импорте модуля.
+    """
+    if 'Logging' in config:
+        log_cfg = config['Logging']
+        log_file = log_cfg.get('file', fallback=None)
+        log_level_str = log_cfg.get('level', fallback='INFO').upper()
+        log_level = logging._nameToLevel.get(log_level_str, logging.INFO)
+        handlers = []
+        if log_file:
+            handlers.append(logging.FileHandler(log_file))
+        else:
+            handlers.append(logging.StreamHandler())
+        logging.basicConfig(
+            level=log_level,
+            handlers=handlers,
+            format=log_cfg.get('format', "%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+        )
     else:
-        handlers.append(logging.StreamHandler())
-    logging.basicConfig(
-        level=log_level,
-        handlers=handlers,
-        format=log_cfg.get('format', "%(asctime)s - %(name)s - %(levelname)s - %(message)s")
-    )
-else:
-    logging.basicConfig(
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        level=logging.INFO
-    )
+        logging.basicConfig(
+            format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+            level=logging.INFO
+        )
 
 
 def _get_config_option(cfg, key, fallback=None, cast_func=None):
     """
     Читает опцию из секции cfg, подставляя значение из переменной окружения
-    если значение имеет формат ${ENV_VAR}. Применяет cast_func к результату, если указано.
+    если значение имеет формат ${ENV_VAR}. Применяет cast_func к строковому результату,
+    если указано (fallback уже нужного типа не приводится).
     """
     raw = cfg.get(key, fallback=None)
     if raw is None:
@@ -49,7 +67,7 @@ def _get_config_option(cfg, key, fallback=None, cast_func=None):
         val = os.getenv(env_key, fallback)
     else:
         val = raw
-    if cast_func and val is not None:
+    if cast_func and isinstance(val, str):
         try:
             return cast_func(val)
         except Exception:
@@ -57,10 +75,57 @@ def _get_config_option(cfg, key, fallback=None, cast_func=None):
             return fallback
     return val
 
+class ImapConfig(namedtuple('ImapConfig', 'host username password mailbox port use_ssl state_file',
+                            defaults=(None, None, None, 'INBOX', 993, True, 'last_uid.txt'))):
+    """
+    Настройки IMAP из секции конфига с уже подставленными переменными окружения.
+    Неизменяемый объект: разбирается один раз и может использоваться сразу
+    несколькими EmailBoxReader (например, в пуле процессов - сериализуется pickle).
+    """
+    __slots__ = ()
+
+    def __repr__(self):
+        # Пароль не должен попадать в логи и трейсбеки
+        fields = ", ".join(
+            f"{name}={'***' if name == 'password' and value is not None else repr(value)}"
+            for name, value in zip(self._fields, self)
+        )
+        return f"{self.__class__.__name__}({fields})"
+
+    @classmethod
+    def from_config(cls, config, section='IMAP', config_file=CONFIG_FILE):
+        if section not in config:
+            logging.getLogger(cls.__name__).error("Секция '%s' не найдена в %s", section, config_file)
+            raise ValueError(f"Секция '{section}' не найдена в {config_file}")
+        cfg = config[section]
+
+        # Чтение с учётом переменных окружения
+        return cls(
+            host=_get_config_option(cfg, 'host'),
+            username=_get_config_option(cfg, 'username'),
+            password=_get_config_option(cfg, 'password'),
+            mailbox=_get_config_option(cfg, 'mailbox', fallback='INBOX'),
+            port=_get_config_option(cfg, 'port', fallback=993, cast_func=int),
+            use_ssl=_get_config_option(cfg, 'use_ssl', fallback=True, cast_func=config._convert_to_boolean),
+            state_file=_get_config_option(cfg, 'state_file', fallback='last_uid.txt'),
+        )
+
+    @classmethod
+    def load(cls, config_file=CONFIG_FILE, section='IMAP'):
+        """Настройки из файла; результат кэшируется по (абсолютный путь, section)."""
+        return _load_imap_config(os.path.abspath(config_file), section)
+
+
+@functools.lru_cache(maxsize=None)
+def _load_imap_config(config_path, section):
+    return ImapConfig.from_config(load_config(config_path), section, config_path)
+
+
 class EmailBoxReader:
     """
     Класс для чтения писем из почтового ящика по IMAP и фильтрации по шаблону темы.
-    Настройки подключения и состояния читаются из config.properties.
+    Настройки подключения и состояния передаются объектом ImapConfig;
+    если он не указан - берутся из config.properties (ImapConfig.load()).
 
     Пример config.properties:
     [Logging]
@@ -80,21 +145,19 @@ class EmailBoxReader:
     Шаблон темы:
     [Тип события][значение] текст [Служебная информация] текст
     """
-    def __init__(self, section='IMAP'):
+    def __init__(self, section='IMAP', *, config=None):
         self.logger = logging.getLogger(self.__class__.__name__)
-        if section not in config:
-            self.logger.error("Секция '%s' не найдена в %s", section, config_file)
-            raise ValueError(f"Секция '{section}' не найдена в {config_file}")
-        cfg = config[section]
+        if config is None:
+            config = ImapConfig.load(section=section)
+        self.config = config
 
-        # Чтение с учётом переменных окружения
-        self.host = _get_config_option(cfg, 'host')
-        self.username = _get_config_option(cfg, 'username')
-        self.password = _get_config_option(cfg, 'password')
-        self.mailbox = _get_config_option(cfg, 'mailbox', fallback='INBOX')
-        self.port = _get_config_option(cfg, 'port', fallback=993, cast_func=int)
-        self.use_ssl = _get_config_option(cfg, 'use_ssl', fallback=True, cast_func=lambda x: cfg._convert_to_boolean(x))
-        self.state_file = _get_config_option(cfg, 'state_file', fallback='last_uid.txt')
+        self.host = config.host
+        self.username = config.username
+        self.password = config.password
+        self.mailbox = config.mailbox
+        self.port = config.port
+        self.use_ssl = config.use_ssl
+        self.state_file = config.state_file
 
         self.last_uid = self._load_last_uid()
         self.conn = None
@@ -207,9 +270,59 @@ class EmailBoxReader:
         return matched
 
 
+def measure_startup(config_file=CONFIG_FILE, section='IMAP'):
+    """
+    Замер времени старта в чистом интерпретаторе: импорт модуля
+    и создание EmailBoxReader (без подключения к серверу).
+    Возвращает словарь с временами в миллисекундах; при ошибке в дочернем
+    процессе - subprocess.CalledProcessError (его stderr в e.stderr).
+    """
+    code = (
+        "import sys, time\n"
+        "t0 = time.perf_counter()\n"
+        "import email_reader\n"
+        "t1 = time.perf_counter()\n"
+        f"cfg = email_reader.ImapConfig.load({config_file!r}, {section!r})\n"
+        "email_reader.EmailBoxReader(config=cfg)\n"
+        "t2 = time.perf_counter()\n"
+        "email_reader.EmailBoxReader(config=email_reader.ImapConfig.load("
+        f"{config_file!r}, {section!r}))\n"
+        "t3 = time.perf_counter()\n"
+        "print((t1 - t0) * 1000, (t2 - t1) * 1000, (t3 - t2) * 1000)\n"
+    )
+    module_dir = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [module_dir, os.environ.get('PYTHONPATH')])))
+    started = time.perf_counter()
+    out = subprocess.run([sys.executable, '-c', code], env=env, check=True,
+                         capture_output=True, text=True).stdout
+    total = (time.perf_counter() - started) * 1000
+    import_ms, first_ms, cached_ms = (float(x) for x in out.split())
+    return {
+        'import_ms': import_ms,
+        'first_reader_ms': first_ms,
+        'cached_reader_ms': cached_ms,
+        'process_ms': total,
+    }
+
+
 # Пример использования в приложении
 if __name__ == '__main__':
-    reader = EmailBoxReader()
+    if len(sys.argv) > 1 and sys.argv[1] == '--startup-time':
+        # python email_reader.py --startup-time [config.properties]
+        try:
+            timings = measure_startup(*sys.argv[2:3])
+        except subprocess.CalledProcessError as e:
+            print("Ошибка замера времени старта:", file=sys.stderr)
+            print(e.stderr, file=sys.stderr)
+            sys.exit(1)
+        for name, value in timings.items():
+            print(f"{name}: {value:.2f}")
+        sys.exit(0)
+
+    # Конфиг читается один раз: и для логирования, и для настроек IMAP
+    config = load_config()
+    setup_logging(config)
+    reader = EmailBoxReader(config=ImapConfig.from_config(config))
     reader.connect()
     try:
         for uid, info, msg in reader.get_messages_by_subject_pattern():
@@ -2,9 +2,19 @@
 # -*- coding: utf-8 -*-
 
 import json
+import os
+import re
 import sys
+import time
+import warnings
+from array import array
 from html import escape
 
+try:
+    import fcntl
+except ImportError:  # Windows - дозапись без блокировки
+    fcntl = None
+
 def generate_html(process_list, output_path):
     """
     Генерирует HTML-файл с таблицей из списка процессов.
@@ -106,10 +116,457 @@ def generate_html(process_list, output_path):
         f.write("\n".join(rows))
         f.write(html_tail)
 
+
+_DURATION_RE = re.compile(
+    r"^(?:(?P<days>\d+)\s+days?,?\s*)?(?P<h>\d+):(?P<m>\d{2}):(?P<s>\d{2}(?:\.\d+)?)$"
+)
+
+
+def _parse_duration(value):
+    """
+    Переводит hold_duration в секунды.
+    Понимает числа, строки вида "HH:MM:SS[.ffff]" и "N days HH:MM:SS".
+    Если разобрать не удалось - возвращает -1.
+    """
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    text = str(value or "").strip()
+    if not text:
+        return -1.0
+    try:
+        return float(text)
+    except ValueError:
+        pass
+    m = _DURATION_RE.match(text)
+    if not m:
+        return -1.0
+    days = int(m.group("days") or 0)
+    hours, minutes = int(m.group("h")), int(m.group("m"))
+    seconds = float(m.group("s"))
+    return days * 86400 + hours * 3600 + minutes * 60 + seconds
+
+
+def _format_duration(seconds):
+    """Обратное к _parse_duration: секунды -> "[N days ]HH:MM:SS[.ffffff]"."""
+    if seconds < 0:
+        return ""
+    seconds = round(seconds, 6)
+    whole = int(seconds)
+    frac = round(seconds - whole, 6)
+    days, rest = divmod(whole, 86400)
+    hours, rest = divmod(rest, 3600)
+    minutes, secs = divmod(rest, 60)
+    text = f"{hours:02d}:{minutes:02d}:{secs:02d}"
+    if frac:
+        text += f"{frac:.6f}"[1:].rstrip("0")
+    if not days:
+        return text
+    return f"{days} {'day' if days == 1 else 'days'} {text}"
+
+
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return -1
+
+
+# Сколько последних снимков показывает отчет по умолчанию (каждый снимок - колонка)
+DEFAULT_TIMELINE_SNAPSHOTS = 20
+
+
+class SnapshotStore:
+    """
+    Append-only хранилище снимков списка процессов.
+
+    Данные лежат по колонкам в array(), строки (query, threadStack и т.п.)
+    интернируются - в колонках хранятся только их номера.
+    На диске - JSON Lines: одна строка на снимок, в ней только новые
+    для хранилища строки и строки таблицы в виде номеров.
+    Поэтому добавление снимка - это дозапись одной строки в файл,
+    а построение отчета читает один файл, а не все исходные JSON.
+    hold_duration меняется в каждом снимке, поэтому он не интернируется,
+    а хранится числом секунд (hold_sec); если разобрать его не удалось,
+    исходный текст хранится в строке таблицы и в hold_text.
+
+    Чтение файла его не меняет: незавершенная последняя запись (ее может
+    в этот момент дописывать другой процесс) просто пропускается.
+    append() пишет под блокировкой файла, сначала дочитывает записи,
+    добавленные другими процессами, и только он отрезает оборванную запись.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        # Таблица интернированных строк
+        self.strings = []
+        self._string_ids = {}
+        # Снимки: метка, время, начало строк снимка (последний элемент - sentinel)
+        self.snap_labels = []
+        self.snap_times = array("d")
+        self.snap_row_start = array("q", [0])
+        # Колонки процессов
+        self.pid = array("q")
+        self.client_addr = array("l")
+        self.backend_start = array("l")
+        self.state = array("l")
+        self.hold_sec = array("d")
+        # Исходный hold_duration для строк, где его не удалось разобрать
+        self.hold_text = {}
+        self.query = array("l")
+        # viewQueue: диапазон элементов для каждой строки процесса
+        self.vq_start = array("q", [0])
+        self.vq_thread_name = array("l")
+        self.vq_thread_stack = array("l")
+        # Конец последней загруженной полной записи в файле
+        self._file_end = 0
+
+    @classmethod
+    def open(cls, path):
+        """Загружает хранилище из файла (если он есть). Файл не изменяется."""
+        store = cls(path)
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                tail = store._load_from(f)
+            if tail.strip():
+                warnings.warn(f"{path}: незавершенная последняя запись пропущена")
+        return store
+
+    def __len__(self):
+        return len(self.snap_labels)
+
+    def _load_from(self, f):
+        """
+        Дочитывает полные записи из f начиная с self._file_end.
+        Возвращает незавершенный хвост (байты после последнего перевода строки).
+        """
+        f.seek(self._file_end)
+        data = f.read()
+        pos = 0
+        while True:
+            nl = data.find(b"\n", pos)
+            if nl < 0:
+                break
+            line = data[pos:nl + 1]
+            if line.strip():
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    raise ValueError(f"{self.path}: поврежденная запись снимка "
+                                     f"(смещение {self._file_end + pos})") from None
+                self._load_record(record)
+            pos = nl + 1
+        self._file_end += pos
+        return data[pos:]
+
+    def _load_record(self, record):
+        for value in record["strings"]:
+            self._string_ids[value] = len(self.strings)
+            self.strings.append(value)
+        self._add_rows(record["label"], record["ts"], record["rows"])
+
+    def _add_rows(self, label, ts, rows):
+        self.snap_labels.append(label)
+        self.snap_times.append(ts)
+        for pid, addr, bstart, state, hold, query, vq in rows:
+            if isinstance(hold, str):
+                self.hold_text[len(self.pid)] = hold
+                hold = -1.0
+            self.pid.append(pid)
+            self.client_addr.append(addr)
+            self.backend_start.append(bstart)
+            self.state.append(state)
+            self.hold_sec.append(hold)
+            self.query.append(query)
+            for tn, ts_id in vq:
+                self.vq_thread_name.append(tn)
+                self.vq_thread_stack.append(ts_id)
+            self.vq_start.append(len(self.vq_thread_name))
+        self.snap_row_start.append(len(self.pid))
+
+    def append(self, process_list, label="", ts=None):
+        """
+        Добавляет снимок (список словарей, как для generate_html)
+        и дописывает его в файл хранилища.
+        Если при разборе снимка возникла ошибка, хранилище не меняется.
+        """
+        if ts is None:
+            ts = time.time()
+        if not self.path:
+            new_strings, rows = self._build_rows(process_list)
+            self._commit(new_strings, label, ts, rows)
+            return
+        with open(self.path, "a+b") as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                # Записи, добавленные другими процессами после open()
+                tail = self._load_from(f)
+                if tail:
+                    # Под блокировкой незавершенная запись - остаток упавшего писателя
+                    warnings.warn(f"{self.path}: оборванная последняя запись удалена")
+                    f.truncate(self._file_end)
+                new_strings, rows = self._build_rows(process_list)
+                record = {"label": label, "ts": ts, "strings": new_strings, "rows": rows}
+                line = json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+                data = line.encode("utf-8")
+                f.write(data)
+                f.flush()
+                self._file_end += len(data)
+            finally:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+        self._commit(new_strings, label, ts, rows)
+
+    def _build_rows(self, process_list):
+        """
+        Переводит снимок в строки таблицы. Новые строки для таблицы
+        интернирования только собираются, self.strings не меняется.
+        """
+        new_strings = []
+        new_ids = {}
+
+        def intern(value):
+            value = "" if value is None else str(value)
+            sid = self._string_ids.get(value)
+            if sid is None:
+                sid = new_ids.get(value)
+            if sid is None:
+                sid = len(self.strings) + len(new_strings)
+                new_strings.append(value)
+                new_ids[value] = sid
+            return sid
+
+        rows = []
+        for proc in process_list:
+            vq = proc.get("viewQueue", [])
+            if isinstance(vq, dict):
+                vq = [vq]
+            hold = proc.get("hold_duration", "")
+            hold_sec = _parse_duration(hold)
+            if hold_sec < 0 and str(hold or "").strip():
+                hold_sec = str(hold)
+            rows.append([
+                _to_int(proc.get("pid")),
+                intern(proc.get("client_addr", "")),
+                intern(proc.get("backend_start", "")),
+                intern(proc.get("state", "")),
+                hold_sec,
+                intern(proc.get("query", "")),
+                [[intern(item.get("ThreadName", "")),
+                  intern(item.get("threadStack", ""))] for item in vq],
+            ])
+        return new_strings, rows
+
+    def _commit(self, new_strings, label, ts, rows):
+        self._load_record({"strings": new_strings, "label": label, "ts": ts, "rows": rows})
+
+    def hold_display(self, row):
+        """hold_duration строки для отчета."""
+        text = self.hold_text.get(row)
+        return text if text is not None else _format_duration(self.hold_sec[row])
+
+    def snapshot_rows(self, snap):
+        """Диапазон номеров строк процессов для снимка snap."""
+        return range(self.snap_row_start[snap], self.snap_row_start[snap + 1])
+
+    def key(self, row):
+        """Ключ процесса: (pid, backend_start) - pid может переиспользоваться."""
+        return self.pid[row], self.backend_start[row]
+
+    def timeline(self, last=DEFAULT_TIMELINE_SNAPSHOTS):
+        """
+        Строит индекс по последним last снимкам (last > 0).
+
+        :return: (номера снимков, {(pid, backend_start): {снимок: строка}})
+        """
+        total = len(self)
+        if last <= 0:
+            raise ValueError(f"Число снимков должно быть больше 0: {last}")
+        first = max(0, total - last)
+        snaps = list(range(first, total))
+        index = {}
+        for snap in snaps:
+            for row in self.snapshot_rows(snap):
+                index.setdefault(self.key(row), {})[snap] = row
+        return snaps, index
+
+
+def generate_timeline_html(store, output_path, last=DEFAULT_TIMELINE_SNAPSHOTS, hold_threshold=60.0):
+    """
+    Генерирует HTML-отчет по нескольким снимкам из SnapshotStore.
+
+    Процессы сгруппированы по (pid, backend_start). Для каждого показан
+    hold_duration в каждом снимке; подсвечиваются новые процессы (появились
+    в последнем снимке), исчезнувшие (были в предыдущем, нет в последнем)
+    и долгие (hold_duration в последнем появлении >= hold_threshold секунд).
+
+    :param store: SnapshotStore
+    :param output_path: путь до выходного HTML-файла
+    :param last: сколько последних снимков показывать (> 0)
+    :param hold_threshold: порог hold_duration в секундах
+    """
+    snaps, index = store.timeline(last)
+    s = store.strings
+    last_snap = snaps[-1] if snaps else None
+    prev_snap = snaps[-2] if len(snaps) > 1 else None
+
+    html_head = """<!DOCTYPE html>
+<html lang="ru">
+<head>
+    <meta charset="UTF-8">
+    <title>Динамика процессов</title>
+    <style>
+        table { 
+            border-collapse: collapse; 
+            width: 100%;
+        }
+        th, td { 
+            border: 1px solid #ccc; 
+            padding: 8px; 
+            text-align: left;
+            vertical-align: top;
+        }
+        th {
+            background: #f0f0f0;
+        }
+        .details {
+            background: #fafafa;
+            font-family: monospace;
+            white-space: pre-wrap;
+        }
+        .new { background: #e6ffe6; }
+        .vanished { background: #eeeeee; color: #888; }
+        .long { background: #ffe6e6; }
+    </style>
+</head>
+<body>
+    <h1>Динамика процессов</h1>
+"""
+    html_tail = """        </tbody>
+    </table>
+</body>
+</html>
+"""
+
+    summary = {"new": 0, "vanished": 0, "long": 0}
+    entries = []
+    for key, seen in index.items():
+        rows_seen = sorted(seen)
+        last_row = seen[rows_seen[-1]]
+        if last_snap in seen and prev_snap is not None and prev_snap not in seen:
+            status = "new"
+        elif last_snap not in seen:
+            status = "vanished" if prev_snap in seen else "gone"
+        else:
+            status = ""
+        is_long = store.hold_sec[last_row] >= hold_threshold
+        for name, flag in (("new", status == "new"), ("vanished", status == "vanished"), ("long", is_long)):
+            if flag:
+                summary[name] += 1
+        entries.append((not is_long, -store.hold_sec[last_row], key, seen, rows_seen, last_row, status, is_long))
+    # Сначала долгие, затем по убыванию hold_duration
+    entries.sort(key=lambda e: (e[0], e[1], e[2]))
+
+    colspan = 5 + len(snaps)
+    header_snaps = "".join(
+        f"\n                <th>{escape(store.snap_labels[snap] or str(snap))}<br>"
+        f"{escape(time.strftime('%H:%M:%S', time.localtime(store.snap_times[snap])))}</th>"
+        for snap in snaps
+    )
+
+    rows = []
+    for _, _, key, seen, rows_seen, last_row, status, is_long in entries:
+        pid = escape(str(key[0]))
+        css = " ".join(c for c in (status if status != "gone" else "", "long" if is_long else "") if c)
+        cells = []
+        for snap in snaps:
+            row = seen.get(snap)
+            cells.append(f"<td>{escape(store.hold_display(row)) if row is not None else ''}</td>")
+        first_sec, last_sec = store.hold_sec[seen[rows_seen[0]]], store.hold_sec[last_row]
+        growth = f"{last_sec - first_sec:+.1f}s" if first_sec >= 0 and last_sec >= 0 else ""
+        rows.append(f"""            <tr class="{css}">
+                <td>{pid}</td>
+                <td>{escape(s[store.client_addr[last_row]])}</td>
+                <td>{escape(s[key[1]])}</td>
+                <td>{escape(s[store.state[last_row]])}</td>
+                <td>{len(rows_seen)}/{len(snaps)} {escape(growth)}</td>
+                {''.join(cells)}
+            </tr>""")
+
+        details_lines = []
+        for i in range(store.vq_start[last_row], store.vq_start[last_row + 1]):
+            tn = escape(s[store.vq_thread_name[i]])
+            ts = escape(s[store.vq_thread_stack[i]])
+            details_lines.append(f"ThreadName: {tn}\nThreadStack: {ts}")
+        details_text = f"Query: {escape(s[store.query[last_row]])}\n\n" + "\n\n".join(details_lines)
+        rows.append(f"""            <tr class="{css}">
+                <td class="details" colspan="{colspan}">{details_text}</td>
+            </tr>""")
+
+    summary_html = (
+        f"    <p>Снимков: {len(snaps)} из {len(store)}; процессов: {len(entries)}; "
+        f"новых: {summary['new']}; исчезнувших: {summary['vanished']}; "
+        f"долгих (&gt;= {hold_threshold:g}s): {summary['long']}</p>\n"
+    )
+    table_head = f"""    <table>
+        <thead>
+            <tr>
+                <th>PID</th>
+                <th>Client Addr</th>
+                <th>Backend Start</th>
+                <th>State</th>
+                <th>Seen / Growth</th>{header_snaps}
+            </tr>
+        </thead>
+        <tbody>
+"""
+
+    with open(output_path, "w", encoding="utf-8") as f:
+        f.write(html_head)
+        f.write(summary_html)
+        f.write(table_head)
+        f.write("\n".join(rows))
+        f.write(html_tail)
+
+
+def print_usage():
+    print("Использование:")
+    print("  python3 gen_table.py input.json output.html")
+    print("  python3 gen_table.py append store.jsonl input.json [input2.json ...]")
+    print("  python3 gen_table.py diff store.jsonl output.html [N последних снимков, по умолчанию "
+          f"{DEFAULT_TIMELINE_SNAPSHOTS}] [порог hold, сек]")
+    sys.exit(1)
+
+
 if __name__ == "__main__":
+    if len(sys.argv) >= 4 and sys.argv[1] == "append":
+        store = SnapshotStore.open(sys.argv[2])
+        for input_file in sys.argv[3:]:
+            with open(input_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            store.append(data, label=os.path.basename(input_file), ts=os.path.getmtime(input_file))
+        print(f"Снимков в {sys.argv[2]}: {len(store)}")
+        sys.exit(0)
+
+    if 4 <= len(sys.argv) <= 6 and sys.argv[1] == "diff":
+        try:
+            last = int(sys.argv[4]) if len(sys.argv) > 4 else DEFAULT_TIMELINE_SNAPSHOTS
+            threshold = float(sys.argv[5]) if len(sys.argv) > 5 else 60.0
+        except ValueError:
+            print_usage()
+        if last <= 0:
+            print(f"N должно быть больше 0: {last}")
+            sys.exit(1)
+        if not os.path.exists(sys.argv[2]):
+            print(f"Файл хранилища не найден: {sys.argv[2]}")
+            sys.exit(1)
+        store = SnapshotStore.open(sys.argv[2])
+        generate_timeline_html(store, sys.argv[3], last=last, hold_threshold=threshold)
+        print(f"HTML-страница успешно сохранена в {sys.argv[3]}")
+        sys.exit(0)
+
     if len(sys.argv) != 3:
-        print("Использование: python3 gen_table.py input.json output.html")
-        sys.exit(1)
+        print_usage()
 
     input_file  = sys.argv[1]
     output_file = sys.argv[2]